@@ -1,16 +1,37 @@
-import json
+import asyncio
+import queue
+import re
+import threading
 from pathlib import Path
 from datetime import datetime, date
 import calendar
+from collections import defaultdict
+from typing import Iterator
 
+import orjson
 import streamlit as st
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAIError
 
 # -------------------------------
 # 0. OpenAI 설정
 # -------------------------------
 api_key = st.secrets["OPENAI_API_KEY"]
-client = OpenAI()
+LLM_MODEL = "gpt-4o-mini"
+
+@st.cache_resource
+def get_llm_loop() -> asyncio.AbstractEventLoop:
+    """모든 세션이 공유하는 LLM 요청용 이벤트 루프 (백그라운드 스레드에서 실행)"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_client() -> AsyncOpenAI:
+    """세션과 재실행 사이에서 커넥션 풀을 공유하도록 클라이언트를 한 번만 생성"""
+    return AsyncOpenAI()
+
+llm_loop = get_llm_loop()
+client = get_client()
 
 # -------------------------------
 # 1. JSON 데이터 로딩
@@ -18,8 +39,7 @@ client = OpenAI()
 @st.cache_data
 def load_eco_data():
     json_path = Path(__file__).parent / "eco_programs.json"
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = orjson.loads(json_path.read_bytes())
     return data
 
 eco_data = load_eco_data()
@@ -33,13 +53,16 @@ def build_system_prompt(eco_data: dict) -> str:
     max_people = rules.get("maxPeoplePerTeam")
     min_people = rules.get("minPeoplePerTeam")
     deadline_hours = rules.get("reservationDeadlineHours")
-    json_str = json.dumps(eco_data, ensure_ascii=False)
+    program_lines = "\n".join(
+        f"- {p['programId']} {p['name']} ({p['target']}, {p['durationMinutes']}분)"
+        for p in eco_data.get("programs", [])
+    )
 
     system_prompt = f"""
 너는 {center_name} 온라인 방문 예약을 도와주는 AI 챗봇이야.
 
-아래 JSON 데이터는 자연생태관의 프로그램, 시간표, 방문 규정을 담고 있어.
-이 JSON 데이터만을 기준으로 대답해야 해. 모르는 정보는 "해당 정보는 제공되지 않습니다."라고 말해.
+프로그램 상세 정보, 날짜별 시간표, FAQ는 제공된 도구(function)를 호출해서 확인해.
+도구로 확인한 데이터만을 기준으로 대답해야 해. 모르는 정보는 "해당 정보는 제공되지 않습니다."라고 말해.
 그리고 자연생태관 프로그램과 연관되어 체험할 수 있는 동식물들에 대해서는 한국 자연생태관 기준으로만 짧고 명료하게 대답해주고, 자세한 문의사항은 고객센터로 안내해줘.
 
 방문 규칙:
@@ -47,13 +70,13 @@ def build_system_prompt(eco_data: dict) -> str:
 - 1팀 최대 인원: {max_people}명
 - 예약 마감: 방문 예정일 {deadline_hours}시간 전까지
 
-JSON 데이터:
-{json_str}
+프로그램 목록:
+{program_lines}
 
 답변 시 지켜야 할 원칙:
 1. 사용자가 날짜, 인원, 대상(초등학생/중학생 등)을 말하면,
-   JSON의 programs와 availableSlots를 보고 가능한 프로그램과 시간을 안내해.
-2. 정원(capacity)와 reserved를 보고, 남은 자리가 없으면 "정원 마감"이라고 알려줘.
+   find_slots_for_date 도구로 해당 날짜의 슬롯을 조회해서 가능한 프로그램과 시간을 안내해.
+2. 슬롯의 남은 자리(remain)가 없으면 "정원 마감"이라고 알려줘.
 3. 사용자가 특정 프로그램과 시간을 선택하면, "예약 정보를 폼에 자동으로 입력하시겠습니까?"라고 물어봐.
 4. 사용자가 승인하면 다음 형식으로 정확히 답변해:
    [AUTO_FILL]
@@ -62,71 +85,262 @@ JSON 데이터:
    TIME: HH:MM-HH:MM
    PEOPLE: 인원수
    [/AUTO_FILL]
-5. 질문이 FAQ 내용과 관련 있으면, faq 항목을 참고해서 답해.
+5. 질문이 FAQ 내용과 관련 있으면, list_faq 도구로 FAQ를 조회해서 답해.
 6. 항상 한국어로, 친절하고 이해하기 쉽게 설명해.
 """
     return system_prompt
 
+# 스크립트는 재실행마다 처음부터 다시 실행되므로, 프로세스 단위로 캐시해 한 번만 생성
+# (시각, 난수 등 가변 값을 넣지 않아야 OpenAI 프롬프트 캐시가 재사용됨)
+@st.cache_resource
+def get_system_prompt() -> str:
+    return build_system_prompt(eco_data)
+
+SYSTEM_PROMPT = get_system_prompt()
+
+# LLM이 필요할 때만 조회하는 도구 정의 (JSON 전체를 프롬프트에 넣지 않음)
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "find_slots_for_date",
+            "description": "특정 날짜의 프로그램별 예약 슬롯(시간, 정원, 예약 인원, 잔여 인원)을 조회한다.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {"type": "string", "description": "조회할 날짜 (YYYY-MM-DD)"},
+                },
+                "required": ["date"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_program",
+            "description": "프로그램 ID 또는 이름으로 프로그램 상세 정보와 전체 예약 슬롯을 조회한다.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "program": {"type": "string", "description": "프로그램 ID(예: P001) 또는 프로그램명"},
+                },
+                "required": ["program"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_faq",
+            "description": "자연생태관 자주 묻는 질문(FAQ) 목록을 조회한다.",
+            "parameters": {"type": "object", "properties": {}},
+        },
+    },
+]
+
+MAX_TOOL_ROUNDS = 5
+# 스트리밍 응답 대기 설정 (새 조각 없이 기다리는 최대 시간)
+CHUNK_POLL_SECONDS = 0.5
+LLM_STREAM_TIMEOUT_SECONDS = 60
+# LLM에 보내는 최근 대화 메시지 수 (사용자/챗봇 8턴)
+MAX_HISTORY_MESSAGES = 16
+
+def _dispatch_tool(name: str, args: dict):
+    if name == "find_slots_for_date":
+        # 내부용 date_obj 필드는 LLM에 보내지 않음
+        return [
+            {k: v for k, v in slot.items() if k != "date_obj"}
+            for slot in slot_index.get(str(args.get("date", "")), [])
+        ]
+    if name == "get_program":
+        key = str(args.get("program", ""))
+        for p in eco_data.get("programs", []):
+            if key in (p["programId"], p["name"]):
+                return p
+        return {"error": "해당 프로그램을 찾을 수 없습니다."}
+    if name == "list_faq":
+        return eco_data.get("faq", [])
+    return {"error": f"알 수 없는 도구: {name}"}
+
+def run_tool(name: str, arguments: str):
+    """LLM이 요청한 도구를 eco_data 기준으로 실행"""
+    try:
+        args = orjson.loads(arguments or "{}")
+    except orjson.JSONDecodeError:
+        args = {}
+    if not isinstance(args, dict):
+        args = {}
+
+    # 도구 오류가 응답 전체를 중단시키지 않도록 결과로 돌려줌
+    try:
+        return _dispatch_tool(name, args)
+    except Exception as e:
+        return {"error": f"도구 실행 중 오류가 발생했습니다: {e}"}
+
+async def stream_llm(messages, chunks: queue.Queue):
+    """공유 이벤트 루프에서 LLM 응답을 스트리밍하며 텍스트 조각을 chunks에 넣음"""
+    for round_no in range(MAX_TOOL_ROUNDS + 1):
+        # 도구 호출이 반복되면 마지막에는 도구 없이 최종 답변을 받음
+        stream = await client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice="none" if round_no == MAX_TOOL_ROUNDS else "auto",
+            temperature=0.2,
+            stream=True,
+        )
+
+        tool_calls = {}
+        content_parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+                chunks.put(delta.content)
+            # 도구 호출은 여러 청크로 나뉘어 오므로 index별로 이어 붙임
+            for tc in delta.tool_calls or []:
+                call = tool_calls.setdefault(tc.index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""},
+                })
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function and tc.function.name:
+                    call["function"]["name"] += tc.function.name
+                if tc.function and tc.function.arguments:
+                    call["function"]["arguments"] += tc.function.arguments
+
+        if not tool_calls:
+            return
+
+        # 도구 호출 전에 출력된 안내 문구는 최종 답변과 문단을 나눔
+        content = "".join(content_parts)
+        if content:
+            chunks.put("\n\n")
+
+        # 도구 호출 결과를 대화에 추가한 뒤 다시 요청 (모델이 자신의 안내 문구도 보도록 포함)
+        calls = [tool_calls[i] for i in sorted(tool_calls)]
+        messages.append({"role": "assistant", "content": content or None, "tool_calls": calls})
+        for call in calls:
+            result = run_tool(call["function"]["name"], call["function"]["arguments"])
+            messages.append({
+                "role": "tool",
+                "tool_call_id": call["id"],
+                "content": orjson.dumps(result).decode(),
+            })
+
+_STREAM_END = object()
+
 def call_llm(messages):
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        temperature=0.2,
-    )
-    return completion.choices[0].message.content
+    """LLM 응답을 스트리밍으로 받아 텍스트 조각을 순서대로 yield"""
+    chunks = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(stream_llm(messages, chunks), llm_loop)
+    # 정상 종료, 오류, 취소 모두에서 스트림 종료를 알림
+    future.add_done_callback(lambda _: chunks.put(_STREAM_END))
+    idle = 0.0
+    try:
+        while True:
+            try:
+                item = chunks.get(timeout=CHUNK_POLL_SECONDS)
+            except queue.Empty:
+                idle += CHUNK_POLL_SECONDS
+                if idle >= LLM_STREAM_TIMEOUT_SECONDS:
+                    raise TimeoutError("LLM 응답이 지연되고 있습니다. 잠시 후 다시 시도해 주세요.")
+                continue
+            if item is _STREAM_END:
+                break
+            idle = 0.0
+            yield item
+        # 요청 중 발생한 예외를 호출한 쪽으로 전달
+        future.result()
+    finally:
+        future.cancel()
 
-def chat_with_eco_center(history, user_message: str) -> str:
-    system_prompt = build_system_prompt(eco_data)
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(history)
+def chat_with_eco_center(history, user_message: str) -> Iterator[str]:
+    # 고정된 시스템 프롬프트를 항상 맨 앞에 두고, 가변적인 대화 기록은 그 뒤에 붙임
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages.extend(history[-MAX_HISTORY_MESSAGES:])
     messages.append({"role": "user", "content": user_message})
     return call_llm(messages)
 
+_AUTO_FILL_RE = re.compile(r"\[AUTO_FILL\]\s*(.*?)\s*\[/AUTO_FILL\]", re.DOTALL)
+# 줄바꿈을 넘어가지 않도록 가로 공백만 허용 (빈 값도 키로 유지, CRLF의 \r 제거)
+_KV_RE = re.compile(r"^[ \t]*(\w+)[ \t]*:[ \t]*(.*?)[ \t\r]*$", re.M)
+
 def parse_auto_fill(response: str):
     """챗봇 응답에서 [AUTO_FILL] 태그를 파싱"""
-    if "[AUTO_FILL]" in response and "[/AUTO_FILL]" in response:
-        start = response.find("[AUTO_FILL]") + len("[AUTO_FILL]")
-        end = response.find("[/AUTO_FILL]")
-        content = response[start:end].strip()
-        
-        data = {}
-        for line in content.split("\n"):
-            if ":" in line:
-                key, value = line.split(":", 1)
-                data[key.strip()] = value.strip()
-        return data
-    return None
+    m = _AUTO_FILL_RE.search(response)
+    return dict(_KV_RE.findall(m.group(1))) if m else None
 
-def find_slots_for_date(dt: date):
-    """특정 날짜의 예약 가능한 프로그램 슬롯 찾기"""
-    target_str = dt.strftime("%Y-%m-%d")
-    results = []
+@st.cache_data
+def build_slot_index():
+    """날짜 문자열(YYYY-MM-DD)별 프로그램 슬롯 인덱스를 한 번만 생성"""
+    index = defaultdict(list)
     for p in eco_data.get("programs", []):
         for slot in p.get("availableSlots", []):
-            if slot["date"] == target_str:
-                remain = slot["capacity"] - slot["reserved"]
-                results.append({
-                    "programId": p["programId"],
-                    "programName": p["name"],
-                    "target": p["target"],
-                    "time": slot["time"],
-                    "capacity": slot["capacity"],
-                    "reserved": slot["reserved"],
-                    "remain": remain,
-                })
-    return results
+            index[slot["date"]].append({
+                "date_obj": date.fromisoformat(slot["date"]),
+                "programId": p["programId"],
+                "programName": p["name"],
+                "target": p["target"],
+                "time": slot["time"],
+                "capacity": slot["capacity"],
+                "reserved": slot["reserved"],
+                "remain": slot["capacity"] - slot["reserved"],
+            })
+    return dict(index)
 
-# -------------------------------
-# 3. Streamlit 화면 구성
-# -------------------------------
-st.set_page_config(
-    page_title="단체 예약 예약 신청",
-    page_icon="🌿",
-    layout="wide",
-)
+slot_index = build_slot_index()
 
-# CSS 스타일
-st.markdown("""
+@st.cache_data
+def build_available_days_index():
+    """(연, 월)별 예약 가능한 일(day) 집합을 한 번만 생성"""
+    index = defaultdict(set)
+    # 슬롯 인덱스에 미리 파싱해 둔 date 객체를 사용 (문자열 재파싱 없음)
+    for slots in slot_index.values():
+        for slot in slots:
+            slot_date = slot["date_obj"]
+            index[(slot_date.year, slot_date.month)].add(slot_date.day)
+    return {key: frozenset(days) for key, days in index.items()}
+
+available_days_index = build_available_days_index()
+
+def find_slots_for_date(dt: date):
+    """특정 날짜의 예약 가능한 프로그램 슬롯 찾기"""
+    return slot_index.get(dt.isoformat(), [])
+
+@st.cache_data(max_entries=64)
+def cached_monthcalendar(year: int, month: int):
+    """(연, 월)별 달력 주 단위 배열을 불변 튜플로 캐시"""
+    return tuple(tuple(week) for week in calendar.monthcalendar(year, month))
+
+# 요일 헤더 (달력 테이블 첫 행으로 사용하는 고정 HTML)
+WEEK_HEADER_HTML = "<tr>" + "".join(
+    f"<th style='text-align: center; color: {'red' if i == 0 else 'black'};'>{day}</th>"
+    for i, day in enumerate(['일', '월', '화', '수', '목', '금', '토'])
+) + "</tr>"
+
+def build_calendar_html(cal, available_dates, selected_day) -> str:
+    """월 달력을 하나의 HTML 테이블로 생성 (날짜별 위젯 대신 정적 표시)"""
+    rows = []
+    for week in cal:
+        cells = []
+        for day in week:
+            if day == 0:
+                cells.append("<td></td>")
+            elif day == selected_day:
+                cells.append(f"<td class='cal-day selected'>🟡 {day}</td>")
+            elif day in available_dates:
+                cells.append(f"<td class='cal-day available'>🟢 {day}</td>")
+            else:
+                cells.append(f"<td class='cal-day unavailable'>{day}</td>")
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+    return "<table class='cal-table'>" + WEEK_HEADER_HTML + "".join(rows) + "</table>"
+
+CSS_BLOCK = """
 <style>
     .main-title {
         font-size: 24px;
@@ -152,6 +366,30 @@ st.markdown("""
         height: 600px;
         overflow-y: auto;
     }
+    .cal-table {
+        width: 100%;
+        table-layout: fixed;
+        border-collapse: separate;
+        border-spacing: 6px;
+    }
+    .cal-table th, .cal-table td {
+        text-align: center;
+        padding: 8px;
+        border: none;
+        border-radius: 5px;
+    }
+    .cal-day.available {
+        background-color: #e8f5e9;
+        font-weight: bold;
+    }
+    .cal-day.selected {
+        background-color: #1e3a8a;
+        color: white;
+        font-weight: bold;
+    }
+    .cal-day.unavailable {
+        color: #ccc;
+    }
     .stButton>button {
         background-color: #1e3a8a;
         color: white;
@@ -160,7 +398,21 @@ st.markdown("""
         border-radius: 5px;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# -------------------------------
+# 3. Streamlit 화면 구성
+# -------------------------------
+st.set_page_config(
+    page_title="단체 예약 예약 신청",
+    page_icon="🌿",
+    layout="wide",
+)
+
+# CSS 스타일
+# 요소가 빠지면 Streamlit이 다음 전체 실행 때 DOM에서 제거하므로 전체 실행마다 출력해야 함
+# (fragment 단위 재실행에서는 다시 출력되지 않음)
+st.markdown(CSS_BLOCK, unsafe_allow_html=True)
 
 # Session state 초기화
 if "chat_history" not in st.session_state:
@@ -194,7 +446,17 @@ st.markdown('<div class="main-title">단체 예약 예약 신청</div>', unsafe_
 # 두 개의 컬럼으로 레이아웃 구성 (간격 추가)
 col1, col2 = st.columns([1.5, 1], gap="large")
 
-with col1:
+def shift_month(delta: int):
+    """현재 보고 있는 월을 delta개월만큼 이동"""
+    month_index = st.session_state.current_year * 12 + st.session_state.current_month - 1 + delta
+    year, month_offset = divmod(month_index, 12)
+    st.session_state.current_year = year
+    st.session_state.current_month = month_offset + 1
+
+# 각 패널은 fragment로 분리해 상호작용 시 해당 패널만 다시 실행
+# (월 이동은 달력만, 폼 제출은 폼만, 채팅은 챗봇만 다시 그림)
+@st.fragment
+def month_calendar():
     # 캘린더 섹션
     st.markdown("### 날짜 선택")
     
@@ -202,82 +464,55 @@ with col1:
     col_month_nav = st.columns([0.3, 2.4, 0.3])
     
     with col_month_nav[0]:
-        if st.button("◀", key="prev_month", use_container_width=True):
-            if st.session_state.current_month == 1:
-                st.session_state.current_month = 12
-                st.session_state.current_year -= 1
-            else:
-                st.session_state.current_month -= 1
-            st.rerun()
+        st.button("◀", key="prev_month", use_container_width=True, on_click=shift_month, args=(-1,))
     
     with col_month_nav[1]:
         st.markdown(f"<h3 style='text-align: center; margin: 0;'>{st.session_state.current_year}. {st.session_state.current_month:02d}</h3>", unsafe_allow_html=True)
     
     with col_month_nav[2]:
-        if st.button("▶", key="next_month", use_container_width=True):
-            if st.session_state.current_month == 12:
-                st.session_state.current_month = 1
-                st.session_state.current_year += 1
-            else:
-                st.session_state.current_month += 1
-            st.rerun()
+        st.button("▶", key="next_month", use_container_width=True, on_click=shift_month, args=(1,))
     
     st.markdown("<br>", unsafe_allow_html=True)
     
     # 간단한 캘린더 표시
     year = st.session_state.current_year
     month = st.session_state.current_month
-    cal = calendar.monthcalendar(year, month)
-    
-    # 요일 헤더
-    days = ['일', '월', '화', '수', '목', '금', '토']
-    cols_header = st.columns(7)
-    for i, day in enumerate(days):
-        with cols_header[i]:
-            st.markdown(f"<div style='text-align: center; color: {'red' if i==0 else 'black'};'>{day}</div>", unsafe_allow_html=True)
+    cal = cached_monthcalendar(year, month)
     
     # 캘린더 날짜
-    available_dates = []
-    for p in eco_data.get("programs", []):
-        for slot in p.get("availableSlots", []):
-            slot_date = datetime.strptime(slot["date"], "%Y-%m-%d")
-            if slot_date.month == month and slot_date.year == year:
-                available_dates.append(slot_date.day)
+    available_dates = available_days_index.get((year, month), frozenset())
     
-    available_dates = list(set(available_dates))
+    # 선택된 날짜 (현재 보고 있는 월에 속할 때만)
+    selected = st.session_state.selected_date
+    selected_day = None
+    if selected and selected.year == year and selected.month == month:
+        selected_day = selected.day
     
-    for week in cal:
-        cols = st.columns(7)
-        for i, day in enumerate(week):
-            with cols[i]:
-                if day == 0:
-                    st.write("")
-                else:
-                    # 선택된 날짜 확인
-                    is_selected = (st.session_state.selected_date and 
-                                   st.session_state.selected_date.year == year and 
-                                   st.session_state.selected_date.month == month and 
-                                   st.session_state.selected_date.day == day)
-                    
-                    if day in available_dates:
-                        # 예약 가능한 날짜만 버튼으로 표시
-                        if is_selected:
-                            # 선택된 날짜
-                            if st.button(f"🟡 {day}", key=f"date_{year}_{month}_{day}", 
-                                       use_container_width=True,
-                                       type="primary"):
-                                st.session_state.selected_date = date(year, month, day)
-                                st.rerun()
-                        else:
-                            # 선택되지 않은 예약 가능 날짜
-                            if st.button(f"🟢 {day}", key=f"date_{year}_{month}_{day}", 
-                                       use_container_width=True):
-                                st.session_state.selected_date = date(year, month, day)
-                                st.rerun()
-                    else:
-                        # 예약 불가능한 날짜는 텍스트로만 표시
-                        st.markdown(f"<div style='text-align: center; padding: 8px; color: #ccc;'>{day}</div>", unsafe_allow_html=True)
+    # 달력은 HTML 테이블 한 번으로 그리고, 날짜 선택은 위젯 하나로 처리
+    st.markdown(
+        build_calendar_html(cal, available_dates, selected_day),
+        unsafe_allow_html=True,
+    )
     
+    day_options = sorted(available_dates)
+    if day_options:
+        picked_day = st.radio(
+            "예약 가능 날짜",
+            options=day_options,
+            index=day_options.index(selected_day) if selected_day in day_options else None,
+            format_func=lambda d: f"{month}월 {d}일",
+            horizontal=True,
+            key=f"day_picker_{year}_{month}",
+        )
+        if picked_day is not None and picked_day != selected_day:
+            st.session_state.selected_date = date(year, month, picked_day)
+            # 예약 폼에도 선택한 날짜가 반영되도록 전체 화면을 다시 그림
+            st.rerun()
+    else:
+        st.caption("이 달에는 예약 가능한 날짜가 없습니다.")
+
+@st.fragment
+def reservation_form():
     st.markdown("---")
     
     # 선택된 날짜 표시
@@ -323,29 +558,27 @@ with col1:
         else:
             slots = []
         
+        slot_by_option = {f"{s['programName']}|{s['time']}": s for s in slots}
+        
         if slots:
-            options = []
-            labels = []
+            options = list(slot_by_option)
+            label_map = {
+                key: f"[{s['programName']}] {s['time']} (잔여: {s['remain']}명)"
+                for key, s in slot_by_option.items()
+            }
             selected_index = 0
             
-            for idx, s in enumerate(slots):
-                key = f"{s['programName']}|{s['time']}"
-                label = f"[{s['programName']}] {s['time']} (잔여: {s['remain']}명)"
-                options.append(key)
-                labels.append(label)
-                
-                # 자동 입력 데이터와 일치하는지 확인
-                if st.session_state.auto_fill_data:
-                    auto_program = st.session_state.auto_fill_data.get("PROGRAM")
-                    auto_time = st.session_state.auto_fill_data.get("TIME")
-                    if auto_program and auto_time:
-                        if s['programName'] == auto_program and s['time'] == auto_time:
-                            selected_index = idx
+            # 자동 입력 데이터와 일치하는 슬롯 선택
+            if st.session_state.auto_fill_data:
+                auto_program = st.session_state.auto_fill_data.get("PROGRAM")
+                auto_time = st.session_state.auto_fill_data.get("TIME")
+                auto_key = f"{auto_program}|{auto_time}"
+                selected_index = options.index(auto_key) if auto_key in slot_by_option else 0
             
             selected_program = st.selectbox(
                 "프로그램 및 시간",
                 options=options,
-                format_func=lambda x: labels[options.index(x)],
+                format_func=label_map.get,
                 index=selected_index
             )
         else:
@@ -362,11 +595,8 @@ with col1:
         max_people = 100  # 기본 최대값
         default_people = 10  # 기본 인원
         
-        if selected_program and slots:
-            for s in slots:
-                if f"{s['programName']}|{s['time']}" == selected_program:
-                    max_people = s['remain']
-                    break
+        if selected_program in slot_by_option:
+            max_people = slot_by_option[selected_program]['remain']
         
         # 자동 입력된 인원이 있으면 사용
         if st.session_state.auto_fill_data:
@@ -416,12 +646,7 @@ with col1:
                 st.error("약관에 동의해야 신청이 가능합니다.")
             else:
                 # 선택된 프로그램의 잔여 인원 확인
-                selected_slot = None
-                for s in slots:
-                    if f"{s['programName']}|{s['time']}" == selected_program:
-                        
-                        selected_slot = s
-                        break
+                selected_slot = slot_by_option.get(selected_program)
                 st.info(f"신청 인원: {people}명 잔여 인원: {selected_slot['remain']}")
                 # 잔여 인원 체크
                 if selected_slot and people > selected_slot['remain']:
@@ -446,7 +671,8 @@ with col1:
                     st.session_state.auto_fill_data = None
                     st.session_state.selected_date = None
 
-with col2:
+@st.fragment
+def chat_panel():
     st.markdown('<div class="section-title">AI 예약 상담 챗봇 🤖</div>', unsafe_allow_html=True)
     
     # 챗봇 컨테이너
@@ -463,22 +689,36 @@ with col2:
     
     if prompt:
         # 사용자 메시지 추가
+        history = st.session_state.chat_history[:]
         st.session_state.chat_history.append({"role": "user", "content": prompt})
         
-        with st.spinner("답변을 생성하고 있습니다..."):
-            reply = chat_with_eco_center(st.session_state.chat_history, prompt)
+        # 응답을 생성되는 대로 바로 출력
+        with chat_container:
+            with st.chat_message("user"):
+                st.markdown(prompt)
+            with st.chat_message("assistant"):
+                try:
+                    reply = st.write_stream(chat_with_eco_center(history, prompt))
+                except (TimeoutError, OpenAIError) as e:
+                    reply = None
+                    st.error(f"답변을 생성하지 못했습니다: {e}")
         
-        # 자동 입력 데이터 파싱
-        auto_fill = parse_auto_fill(reply)
-        if auto_fill:
-            st.session_state.auto_fill_data = auto_fill
-            # [AUTO_FILL] 태그 제거한 깨끗한 메시지
-            clean_reply = reply.split("[AUTO_FILL]")[0].strip()
-            st.session_state.chat_history.append({"role": "assistant", "content": clean_reply + "\n\n✅ 예약 정보가 왼쪽 폼에 자동으로 입력되었습니다!"})
+        if reply is None:
+            # 답변 없이 사용자 메시지만 남지 않도록 기록에서 제거
+            st.session_state.chat_history.pop()
         else:
-            st.session_state.chat_history.append({"role": "assistant", "content": reply})
+            # 자동 입력 데이터 파싱
+            auto_fill = parse_auto_fill(reply)
+            if auto_fill:
+                st.session_state.auto_fill_data = auto_fill
+                # [AUTO_FILL] 태그 제거한 깨끗한 메시지
+                clean_reply = reply.split("[AUTO_FILL]")[0].strip()
+                st.session_state.chat_history.append({"role": "assistant", "content": clean_reply + "\n\n✅ 예약 정보가 왼쪽 폼에 자동으로 입력되었습니다!"})
+            else:
+                st.session_state.chat_history.append({"role": "assistant", "content": reply})
         
-        st.rerun()
+            # 폼 자동 입력이 있을 때만 전체 화면을 다시 그림
+            st.rerun(scope="app" if auto_fill else "fragment")
     
     # 대화 초기화 버튼
     if st.button("대화 초기화", use_container_width=True):
@@ -496,6 +736,13 @@ with col2:
         st.session_state.auto_fill_data = None
         st.rerun()
 
+with col1:
+    month_calendar()
+    reservation_form()
+
+with col2:
+    chat_panel()
+
 # 하단 안내 문구
 st.markdown("---")
 st.info("💡 AI 챗봇을 통해 프로그램을 추천받고, 자동으로 예약 정보를 입력받을 수 있습니다.")